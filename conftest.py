@@ -0,0 +1,45 @@
+"""Shared pytest fixtures. Lives at the repo root so tests can import header.py & co."""
+from pathlib import Path
+
+import pytest
+from docx import Document
+
+from docx_diff import assert_docx_equivalent
+
+ROOT = Path(__file__).resolve().parent
+
+
+@pytest.fixture
+def reference_document():
+    """Factory for a fresh Document based on reference.docx with num_sections sections."""
+    def make(num_sections=1):
+        doc = Document(ROOT / "reference.docx")
+        for _ in range(num_sections - 1):
+            doc.add_section()
+        return doc
+
+    return make
+
+
+@pytest.fixture
+def assert_equivalent_build(tmp_path):
+    """
+    Gate for faster code paths: build the same input with the reference and
+    the candidate pipeline and assert the saved packages are equivalent.
+
+        assert_equivalent_build(make_document, reference, candidate)
+
+    make_document returns a fresh Document, reference and candidate take a
+    Document and modify it in place (e.g. thesis.process_document).
+    """
+    def check(make_document, reference, candidate):
+        outputs = []
+        for name, build in (("reference", reference), ("candidate", candidate)):
+            doc = make_document()
+            build(doc)
+            path = tmp_path / f"{name}.docx"
+            doc.save(path)
+            outputs.append(path)
+        assert_docx_equivalent(*outputs)
+
+    return check
@@ -0,0 +1,253 @@
+"""
+Semantic comparison of two docx packages.
+
+Parts are compared after canonicalization: rsid attributes, core property
+timestamps and relationship ids are ignored, relationship files and content
+types are compared as unordered sets. Every XML subtree is hashed once and
+only mismatching subtrees are descended into, so identical regions of large
+documents cost a single hash comparison.
+
+    python docx_diff.py expected.docx actual.docx
+"""
+import difflib
+import hashlib
+import posixpath
+import sys
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+
+NAMESPACES = {
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "m": "http://schemas.openxmlformats.org/officeDocument/2006/math",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "wp": "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "pic": "http://schemas.openxmlformats.org/drawingml/2006/picture",
+    "mc": "http://schemas.openxmlformats.org/markup-compatibility/2006",
+    "v": "urn:schemas-microsoft-com:vml",
+    "cp": "http://schemas.openxmlformats.org/package/2006/metadata/core-properties",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+    "ct": "http://schemas.openxmlformats.org/package/2006/content-types",
+    "xml": "http://www.w3.org/XML/1998/namespace",
+}
+PREFIXES = {uri: prefix for prefix, uri in NAMESPACES.items()}
+
+# Elements whose content changes on every save
+IGNORED_ELEMENTS = {
+    f"{{{NAMESPACES['w']}}}rsids",
+    f"{{{NAMESPACES['dcterms']}}}created",
+    f"{{{NAMESPACES['dcterms']}}}modified",
+    f"{{{NAMESPACES['cp']}}}revision",
+    f"{{{NAMESPACES['cp']}}}lastModifiedBy",
+    f"{{{NAMESPACES['cp']}}}lastPrinted",
+}
+# Containers whose children carry no meaningful order
+UNORDERED_ELEMENTS = {
+    f"{{{NAMESPACES['rel']}}}Relationships",
+    f"{{{NAMESPACES['ct']}}}Types",
+}
+REL_RELATIONSHIP = f"{{{NAMESPACES['rel']}}}Relationship"
+W_P = f"{{{NAMESPACES['w']}}}p"
+W_R = f"{{{NAMESPACES['w']}}}r"
+W_T = f"{{{NAMESPACES['w']}}}t"
+
+
+def short_name(name):
+    """Turn '{uri}local' into 'prefix:local'."""
+    if not name.startswith("{"):
+        return name
+    uri, local = name[1:].split("}", 1)
+    return f"{PREFIXES.get(uri, uri)}:{local}"
+
+
+def rels_path(part):
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def load_relationships(package, part):
+    """Map relationship ids of a part to 'Type Target' strings."""
+    path = rels_path(part)
+    if path not in package:
+        return {}
+    root = ET.fromstring(package[path])
+    return {
+        rel.get("Id"): f"{rel.get('Type')} {rel.get('Target')}"
+        for rel in root
+    }
+
+
+def canonicalize(element, relationships):
+    """Strip volatile content in place and resolve relationship ids to targets."""
+    for child in list(element):
+        if child.tag in IGNORED_ELEMENTS:
+            element.remove(child)
+    for name in list(element.attrib):
+        if element.tag == REL_RELATIONSHIP and name == "Id":
+            del element.attrib[name]
+            continue
+        uri, _, local = name[1:].partition("}")
+        if uri == NAMESPACES["w"] and local.startswith("rsid"):
+            del element.attrib[name]
+        elif uri == NAMESPACES["r"] and element.attrib[name] in relationships:
+            element.attrib[name] = relationships[element.attrib[name]]
+    # OOXML has no mixed content, whitespace around child elements is formatting
+    if len(element):
+        element.text = None
+    element.tail = None
+    for child in element:
+        canonicalize(child, relationships)
+
+
+def hash_tree(element, hashes):
+    """Hash every subtree bottom-up into hashes, keyed by element."""
+    child_hashes = [hash_tree(child, hashes) for child in element]
+    if element.tag in UNORDERED_ELEMENTS:
+        child_hashes.sort()
+    digest = hashlib.sha1()
+    digest.update(element.tag.encode("utf-8"))
+    for name, value in sorted(element.attrib.items()):
+        digest.update(f"\0{name}={value}".encode("utf-8"))
+    digest.update(f"\0{element.text or ''}\0".encode("utf-8"))
+    for child_hash in child_hashes:
+        digest.update(child_hash)
+    hashes[element] = digest.digest()
+    return hashes[element]
+
+
+def describe(element):
+    """Short label for a report line, with text context for paragraphs and runs."""
+    label = short_name(element.tag)
+    if element.tag in (W_P, W_R, W_T):
+        text = "".join(t.text or "" for t in element.iter(W_T))
+        if len(text) > 40:
+            text = text[:40] + "..."
+        label += f" {text!r}"
+    return label
+
+
+def child_path(path, parent, child):
+    same_tag = [c for c in parent if c.tag == child.tag]
+    return f"{path}/{short_name(child.tag)}[{same_tag.index(child) + 1}]"
+
+
+def diff_elements(a, b, path, hashes_a, hashes_b, diffs):
+    """Append differences between two canonical subtrees to diffs."""
+    if hashes_a[a] == hashes_b[b]:
+        return
+    if a.tag != b.tag:
+        diffs.append(f"{path}: {describe(a)} replaced by {describe(b)}")
+        return
+    for name in sorted(set(a.attrib) | set(b.attrib)):
+        if a.get(name) != b.get(name):
+            diffs.append(
+                f"{path}: @{short_name(name)} {a.get(name)!r} != {b.get(name)!r}"
+            )
+    if (a.text or "") != (b.text or ""):
+        diffs.append(f"{path}: text {a.text!r} != {b.text!r}")
+
+    children_a, children_b = list(a), list(b)
+    if a.tag in UNORDERED_ELEMENTS:
+        # Multisets, a duplicated child is a difference too
+        count_a = Counter(hashes_a[c] for c in children_a)
+        count_b = Counter(hashes_b[c] for c in children_b)
+        for label, children, hashes, extra in (
+            ("first", children_a, hashes_a, count_a - count_b),
+            ("second", children_b, hashes_b, count_b - count_a),
+        ):
+            for child in children:
+                if extra[hashes[child]] > 0:
+                    extra[hashes[child]] -= 1
+                    diffs.append(
+                        f"{path}: only in {label}: {ET.tostring(child, encoding='unicode')}"
+                    )
+        return
+
+    matcher = difflib.SequenceMatcher(
+        None,
+        [hashes_a[c] for c in children_a],
+        [hashes_b[c] for c in children_b],
+        autojunk=False,
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        pairs = list(zip(children_a[i1:i2], children_b[j1:j2]))
+        for child_a, child_b in pairs:
+            if child_a.tag == child_b.tag:
+                diff_elements(
+                    child_a, child_b, child_path(path, a, child_a),
+                    hashes_a, hashes_b, diffs,
+                )
+            else:
+                diffs.append(
+                    f"{child_path(path, a, child_a)}: {describe(child_a)} "
+                    f"replaced by {describe(child_b)}"
+                )
+        for child in children_a[i1 + len(pairs):i2]:
+            diffs.append(f"{child_path(path, a, child)}: removed {describe(child)}")
+        for child in children_b[j1 + len(pairs):j2]:
+            diffs.append(f"{child_path(path, b, child)}: added {describe(child)}")
+
+
+def read_package(path):
+    with zipfile.ZipFile(path) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def is_xml_part(name):
+    return name.endswith(".xml") or name.endswith(".rels")
+
+
+def compare_docx(path_a, path_b):
+    """Return a list of human-readable differences, empty if equivalent."""
+    package_a, package_b = read_package(path_a), read_package(path_b)
+    diffs = []
+    for name in sorted(set(package_a) - set(package_b)):
+        diffs.append(f"{name}: only in {path_a}")
+    for name in sorted(set(package_b) - set(package_a)):
+        diffs.append(f"{name}: only in {path_b}")
+
+    for name in sorted(set(package_a) & set(package_b)):
+        data_a, data_b = package_a[name], package_b[name]
+        if data_a == data_b:
+            continue
+        if not is_xml_part(name):
+            diffs.append(f"{name}: binary content differs")
+            continue
+        root_a, root_b = ET.fromstring(data_a), ET.fromstring(data_b)
+        canonicalize(root_a, load_relationships(package_a, name))
+        canonicalize(root_b, load_relationships(package_b, name))
+        hashes_a, hashes_b = {}, {}
+        hash_tree(root_a, hashes_a)
+        hash_tree(root_b, hashes_b)
+        found = len(diffs)
+        diff_elements(
+            root_a, root_b, f"{name}:/{short_name(root_a.tag)}",
+            hashes_a, hashes_b, diffs,
+        )
+        # Never report a mismatch as equivalent, even if no detail was found
+        if hashes_a[root_a] != hashes_b[root_b] and len(diffs) == found:
+            diffs.append(f"{name}: differs")
+    return diffs
+
+
+def assert_docx_equivalent(path_a, path_b, max_report=50):
+    """Assert two docx files are semantically equivalent, listing differences otherwise."""
+    diffs = compare_docx(path_a, path_b)
+    report = "\n".join(diffs[:max_report])
+    if len(diffs) > max_report:
+        report += f"\n... and {len(diffs) - max_report} more"
+    assert not diffs, f"{path_a} and {path_b} differ:\n{report}"
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 3, "Usage: python docx_diff.py expected.docx actual.docx"
+    differences = compare_docx(sys.argv[1], sys.argv[2])
+    for line in differences:
+        print(line)
+    print(f"{len(differences)} differences found")
+    sys.exit(1 if differences else 0)
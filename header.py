@@ -1,7 +1,11 @@
+import json
 import os
 import re
-import shutil
+import time
+import zipfile
 from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache, partial
 
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 from docx.oxml import OxmlElement
@@ -13,10 +17,60 @@ statistics_data = {}
 
 
 def update_reference_doc():
-    shutil.make_archive("reference", "zip", "reference")
-    if os.path.exists("reference.docx"):
-        os.remove("reference.docx")
-    os.rename("reference.zip", "reference.docx")
+    members = {}
+    for root, _, files in os.walk("reference"):
+        for name in files:
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                members[os.path.relpath(path, "reference").replace(os.sep, "/")] = f.read()
+    write_docx_archive("reference.docx", members, source_date_epoch() or 0)
+
+
+# --- Reproducible Output ---
+def source_date_epoch():
+    """Return SOURCE_DATE_EPOCH as an int, or None when deterministic output is off."""
+    value = os.environ.get("SOURCE_DATE_EPOCH")
+    if not value:
+        return None
+    return int(value)
+
+
+def write_docx_archive(path, members, epoch):
+    """
+    Write a docx package with fixed timestamps and canonical member ordering.
+    [Content_Types].xml comes first, the remaining parts follow sorted by name.
+    """
+    # zip cannot represent dates before 1980
+    date_time = time.gmtime(max(epoch, 315532800))[:6]
+    names = sorted(members, key=lambda name: (name != "[Content_Types].xml", name))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in names:
+            info = zipfile.ZipInfo(name, date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 0
+            info.external_attr = 0
+            zf.writestr(info, members[name])
+
+
+def save_document(doc, path):
+    """
+    Save the document. When SOURCE_DATE_EPOCH is set, normalize the core
+    properties and rewrite the package so identical inputs give identical bytes.
+    """
+    epoch = source_date_epoch()
+    if epoch is None:
+        doc.save(path)
+        return
+
+    stamp = datetime.fromtimestamp(epoch, timezone.utc)
+    core = doc.core_properties
+    core.created = stamp
+    core.modified = stamp
+    doc.save(path)
+
+    with zipfile.ZipFile(path) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+    write_docx_archive(path, members, epoch)
 
 
 # --- Helper Functions ---
@@ -243,71 +297,111 @@ def process_table(table):
             cell.width = Pt(column_width_twips / 20)  # Convert to points
 
 
-def set_all_secs_thesis(doc):
-    """Apply formatting to document sections."""
-    num_sections = len(doc.sections)
-    print(f"Document contains {num_sections} sections.")
+# --- Section Layout ---
+LAYOUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts")
+SECTION_KEYS = {"header_distance", "footer_distance", "page_numbering", "footer", "header"}
+PAGE_NUMBERING_KEYS = {"fmt", "start"}
+FOOTER_KEYS = {"linked", "page_field"}
+HEADER_KEYS = {"text", "page_field"}
 
-    assert num_sections == 6, "Document must have at least 6 sections."
-
-    # Section 1,2: Before TOC
-    section1 = doc.sections[0]
-    section1.footer_distance = Pt(56.7)  # Footer distance from the bottom (2 cm)
-    set_page_number_style(section1, fmt="upperRoman", start=1)
-    add_page_number_to_footer(section1)
-
-    section2 = doc.sections[1]
-    section2.footer_distance = Pt(56.7)  # Footer distance from the bottom (2 cm)
-    set_page_number_style(section2, fmt="upperRoman")
-
-    # Section 3: TOC
-    section3 = doc.sections[2]
-    section3.footer_distance = Pt(56.7)  # Footer distance from the bottom (2 cm)
-    section3.footer.is_linked_to_previous = False
-    set_page_number_style(section3, fmt="upperRoman", start=1)
-    add_page_number_to_footer(section3)
-
-    # Section 4: After TOC
-    section4 = doc.sections[3]
-    section4.footer.is_linked_to_previous = False
-    set_page_number_style(section4, fmt="decimal", start=1)
-    for i in range(3, 6):
-        section = doc.sections[i]
-        section.footer_distance = Pt(56.7)  # Footer distance from the bottom (2 cm)
-
-
-def set_all_secs_other(doc):
-    """Apply formatting to document sections."""
-    num_sections = len(doc.sections)
-    print(f"Document contains {num_sections} sections.")
 
-    assert num_sections == 2, "Document must have 2 sections."
+def set_section_distance(section, name, value):
+    """Set header_distance or footer_distance of a section."""
+    setattr(section, name, value)
 
-    section1 = doc.sections[0]
-    set_page_number_style(section1, fmt="decimal", start=1)
 
-def set_headers_other(doc):
-    """
-    Set headers for the only sections in the document.
-    """
-    assert len(doc.sections) == 2, "Document must have exactly 2 section."
-    section = doc.sections[0]
+def link_footer(section, linked):
+    """Link or unlink the footer of a section to the previous one."""
+    section.footer.is_linked_to_previous = linked
+
+
+def set_header_content(section, text, page_field):
+    """Replace the header of a section with text and an optional PAGE field."""
     section.header.is_linked_to_previous = False
-    # Get the header of the section
     header = section.header
     assert len(header.paragraphs) == 1, "Header must contain one paragraph"
     paragraph = header.paragraphs[0]
     # Clear existing content in the paragraph
     for run in paragraph.runs:
         run.clear()
-    # Add header content
-    run = paragraph.add_run(title + " ")
-    run_append_page_number(run)
-    # Set paragraph style
+    run = paragraph.add_run(text)
+    if page_field:
+        run_append_page_number(run)
     paragraph.style = "header"  # Ensure the style name is correct
-    # Set header distance
-    section.header_distance = Pt(56.7)  # Header distance from the top (2 cm)
-    
+
+
+def check_layout_keys(spec, allowed, where):
+    """Reject typos in a layout profile instead of silently ignoring them."""
+    unknown = set(spec) - allowed
+    assert not unknown, f"{where}: unknown keys {sorted(unknown)}"
+
+
+def compile_section(spec, title, where):
+    """Turn one section entry of a layout profile into a tuple of steps."""
+    check_layout_keys(spec, SECTION_KEYS, where)
+    check_layout_keys(spec.get("page_numbering", {}), PAGE_NUMBERING_KEYS, f"{where} page_numbering")
+    check_layout_keys(spec.get("footer", {}), FOOTER_KEYS, f"{where} footer")
+    check_layout_keys(spec.get("header", {}), HEADER_KEYS, f"{where} header")
+    steps = []
+    if "footer_distance" in spec:
+        steps.append(partial(
+            set_section_distance, name="footer_distance", value=Pt(spec["footer_distance"])
+        ))
+    footer = spec.get("footer", {})
+    if "linked" in footer:
+        steps.append(partial(link_footer, linked=footer["linked"]))
+    if "page_numbering" in spec:
+        numbering = spec["page_numbering"]
+        assert "fmt" in numbering, f"{where} page_numbering: 'fmt' is required"
+        steps.append(partial(
+            set_page_number_style, fmt=numbering["fmt"], start=numbering.get("start")
+        ))
+    if footer.get("page_field"):
+        steps.append(add_page_number_to_footer)
+    if "header" in spec:
+        header = spec["header"]
+        assert "text" in header, f"{where} header: 'text' is required"
+        steps.append(partial(
+            set_header_content,
+            text=header["text"].format(title=title),
+            page_field=header.get("page_field", False),
+        ))
+    if "header_distance" in spec:
+        steps.append(partial(
+            set_section_distance, name="header_distance", value=Pt(spec["header_distance"])
+        ))
+    return tuple(steps)
+
+
+@lru_cache(maxsize=None)
+def compile_layout(name, title):
+    """
+    Load layouts/<name>.json (or a path to a JSON file) and compile it into a
+    per-section plan. Cached, so a batch run parses each profile only once.
+    """
+    path = name if name.endswith(".json") else os.path.join(LAYOUT_DIR, f"{name}.json")
+    with open(path, encoding="utf-8") as f:
+        profile = json.load(f)
+    defaults = profile.get("defaults", {})
+    return tuple(
+        compile_section({**defaults, **spec}, title, f"Layout '{name}' section {i}")
+        for i, spec in enumerate(profile["sections"])
+    )
+
+
+def apply_layout(doc, name, title=title):
+    """Apply page numbering, headers and footers from a layout profile in one pass."""
+    plan = compile_layout(name, title)
+    sections = doc.sections
+    num_sections = len(sections)
+    print(f"Document contains {num_sections} sections.")
+    assert num_sections == len(plan), (
+        f"Document must have {len(plan)} sections for layout '{name}', found {num_sections}."
+    )
+    for section, steps in zip(sections, plan):
+        for step in steps:
+            step(section)
+
 
 def run_append_page_number(run):
     # Add page number field
@@ -325,38 +419,6 @@ def run_append_page_number(run):
     run._r.append(fldChar2)
 
 
-def set_headers_thesis(doc):
-    """
-    Set headers for all sections in the document.
-    - First 3 sections: Header without page numbers.
-    - Following section: Header with page numbers.
-    """
-    for i, section in enumerate(doc.sections):
-        section.header.is_linked_to_previous = False
-        # Get the header of the section
-        header = section.header
-
-        assert len(header.paragraphs) == 1, "Header must contain one paragraph"
-        paragraph = header.paragraphs[0]
-
-        # Clear existing content in the paragraph
-        for run in paragraph.runs:
-            run.clear()
-
-        # Add header content
-        if i < 3:  # First 3 sections
-            paragraph.add_run(title + " ")
-        else:  # Fourth section and beyond
-            run = paragraph.add_run(title + " ")
-            run_append_page_number(run)
-
-        # Set paragraph style
-        paragraph.style = "header"  # Ensure the style name is correct
-
-        # Set header distance
-        section.header_distance = Pt(56.7)  # Header distance from the top (2 cm)
-
-
 def add_page_number_to_footer(section):
     """Add page number to the footer of a section."""
     footer = section.footer
@@ -424,14 +486,21 @@ def process_math_equations(doc):
     - Add right-aligned tab stop
     - Structure with equation, tab, and number
     - Detect and extract equation numbers in format (d.d)
+    - Paragraphs numbered by the math_cache.py filter only get the style
     """
     print("\n=== STARTING MATH PARAGRAPH DETECTION AND FORMATTING ===")
     math_para_count = 0
 
-    for i, paragraph in enumerate(doc.paragraphs):
+    paragraphs = doc.paragraphs
+    for i, paragraph in enumerate(paragraphs):
         # Check if paragraph contains math paragraph elements
         if "<m:oMathPara" in paragraph._p.xml:
             math_para_count += 1
+            if paragraph._p.xpath("./w:r[w:tab]/w:t[starts-with(text(), '（')]"):
+                # Number already attached by math_cache.py, only the layout is missing
+                paragraph.style = "FormulaEquationNumbered"
+                restore_first_paragraph(paragraphs, i)
+                continue
             # print(f"\n--- Math Paragraph #{math_para_count} found in paragraph {i} ---")
             all_math_t = paragraph._element.xpath(".//m:t")
 
@@ -466,6 +535,18 @@ def process_math_equations(doc):
     )
 
 
+def restore_first_paragraph(paragraphs, i):
+    """
+    pandoc styles the paragraph after display math as First Paragraph. It does
+    not see the raw OMML inserted by math_cache.py, so restore that here.
+    """
+    if i + 1 >= len(paragraphs):
+        return
+    following = paragraphs[i + 1]
+    if following._p is paragraphs[i]._p.getnext() and para_is_style(following, "body text"):
+        following.style = "First Paragraph"
+
+
 def format_math_paragraph(paragraph, equation_number="replace_me"):
     """
     Format a paragraph containing oMathPara with proper style and equation numbering.
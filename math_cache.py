@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+pandoc filter that caches the LaTeX -> OMML conversion of every equation.
+
+Must run after pandoc-crossref:
+
+    pandoc ... --filter pandoc-crossref --filter math_cache.py
+
+Equations are keyed by their normalized LaTeX source. Cached ones are replaced
+by the stored OpenXML fragment, new ones are converted together in a single
+pandoc call and added to the cache. The cache lives in $MATH_CACHE, one file
+per input (thesis.py and open.py set it), and only keeps equations that are
+still in that input. The number pandoc-crossref appends to a
+display equation is split off and emitted as its own tab + number run, so
+process_math_equations only has to apply the FormulaEquationNumbered style.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+CACHE_FILE = os.environ.get("MATH_CACHE", ".math-cache.json")
+
+# pandoc-crossref appends "\qquad(1.1)", newer releases "\qquad{(1.1)}"
+eqn_number_pattern = re.compile(
+    r"^(.*?)\s*\\qquad\s*\{?\s*\((\d+\.\d+)\)\s*\}?\s*$", re.DOTALL
+)
+paragraph_pattern = re.compile(r"<w:p[ >].*?</w:p>", re.DOTALL)
+omml_pattern = re.compile(
+    r"<m:oMathPara\b.*?</m:oMathPara>|<m:oMath\b.*?</m:oMath>", re.DOTALL
+)
+
+
+def normalize_latex(latex):
+    """Collapse whitespace so cosmetic edits do not invalidate the cache."""
+    # A % comment runs to the end of the line, keep those sources verbatim
+    if "%" in latex:
+        return latex.strip()
+    return " ".join(latex.split())
+
+
+def pandoc_version():
+    result = subprocess.run(
+        ["pandoc", "--version"], capture_output=True, text=True, check=True
+    )
+    return result.stdout.splitlines()[0]
+
+
+def load_cache(version):
+    """Load cached fragments, dropping them if pandoc (and texmath) changed."""
+    if not os.path.exists(CACHE_FILE):
+        return {}
+    with open(CACHE_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("pandoc") != version:
+        return {}
+    return data["equations"]
+
+
+def save_cache(version, equations):
+    # Unique temp name, concurrent builds must not write through the same file
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", suffix=".tmp", delete=False,
+        dir=os.path.dirname(os.path.abspath(CACHE_FILE)),
+    ) as f:
+        json.dump({"pandoc": version, "equations": equations}, f, ensure_ascii=False)
+    os.replace(f.name, CACHE_FILE)
+
+
+def split_equation(math_type, latex):
+    """Return (cache key, normalized LaTeX, equation number or None)."""
+    number = None
+    if math_type == "DisplayMath":
+        match = eqn_number_pattern.match(latex)
+        if match:
+            latex, number = match.groups()
+    latex = normalize_latex(latex)
+    return f"{math_type}:{latex}", latex, number
+
+
+def walk_math(node, action):
+    """Call action on every Math inline of the AST."""
+    if isinstance(node, list):
+        for item in node:
+            walk_math(item, action)
+    elif isinstance(node, dict):
+        if node.get("t") == "Math":
+            action(node)
+        else:
+            walk_math(node.get("c"), action)
+
+
+def replace_math(node, replace):
+    """Rebuild the AST, splicing the inlines returned by replace for each Math."""
+    if isinstance(node, list):
+        result = []
+        for item in node:
+            if isinstance(item, dict) and item.get("t") == "Math":
+                result.extend(replace(item))
+            else:
+                result.append(replace_math(item, replace))
+        return result
+    if isinstance(node, dict) and "c" in node:
+        return {**node, "c": replace_math(node["c"], replace)}
+    return node
+
+
+def convert_equations(equations, api_version):
+    """
+    Convert [(math_type, latex), ...] to OMML with one pandoc run.
+    Returns one fragment per equation, None where texmath gave up.
+    """
+    blocks = [
+        {"t": "Para", "c": [{"t": "Math", "c": [{"t": math_type}, latex]}]}
+        for math_type, latex in equations
+    ]
+    doc = {"pandoc-api-version": api_version, "meta": {}, "blocks": blocks}
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "math.docx")
+        subprocess.run(
+            ["pandoc", "-f", "json", "-t", "docx", "-o", output],
+            input=json.dumps(doc).encode("utf-8"),
+            check=True,
+        )
+        with zipfile.ZipFile(output) as zf:
+            document_xml = zf.read("word/document.xml").decode("utf-8")
+
+    paragraphs = paragraph_pattern.findall(document_xml)
+    assert len(paragraphs) == len(equations), (
+        f"Expected {len(equations)} math paragraphs from pandoc, found {len(paragraphs)}"
+    )
+    fragments = []
+    for paragraph in paragraphs:
+        match = omml_pattern.search(paragraph)
+        fragments.append(match.group(0) if match else None)
+    return fragments
+
+
+def number_run(number):
+    """Tab + number run, as format_math_paragraph used to append it."""
+    return f"<w:r><w:tab/><w:t>（{number.replace('.', '-')}）</w:t></w:r>"
+
+
+def main():
+    doc = json.loads(sys.stdin.buffer.read())
+    if len(sys.argv) > 1 and sys.argv[1] != "docx":
+        json.dump(doc, sys.stdout)
+        return
+
+    version = pandoc_version()
+    cache = load_cache(version)
+
+    seen = set()
+    missing = {}
+
+    def collect(math):
+        math_type, latex = math["c"][0]["t"], math["c"][1]
+        key, body, _ = split_equation(math_type, latex)
+        seen.add(key)
+        if key not in cache:
+            missing[key] = (math_type, body)
+
+    walk_math(doc["blocks"], collect)
+
+    # Drop entries of equations that were edited or removed
+    stale = set(cache) - seen
+    cache = {key: fragment for key, fragment in cache.items() if key in seen}
+    if missing:
+        fragments = convert_equations(list(missing.values()), doc["pandoc-api-version"])
+        for key, fragment in zip(missing, fragments):
+            if fragment is not None:
+                cache[key] = fragment
+    if missing or stale:
+        save_cache(version, cache)
+    print(
+        f"Math cache: {len(missing)} equations converted, {len(cache)} cached",
+        file=sys.stderr,
+    )
+
+    def replace(math):
+        math_type, latex = math["c"][0]["t"], math["c"][1]
+        key, _, number = split_equation(math_type, latex)
+        if key not in cache:
+            # Conversion failed, leave it to pandoc and the legacy docx pass
+            return [math]
+        inlines = [{"t": "RawInline", "c": ["openxml", cache[key]]}]
+        if number is not None:
+            inlines.append({"t": "RawInline", "c": ["openxml", number_run(number)]})
+        return inlines
+
+    doc["blocks"] = replace_math(doc["blocks"], replace)
+    json.dump(doc, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
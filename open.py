@@ -4,15 +4,15 @@ from collections import deque
 from docx import Document
 
 from header import (
+    apply_layout,
     fix_reference_format,
     insert_section_breaks,
     process_hyperlink,
     process_math_equations,
     process_table,
     replace_ref_format_in_doc,
+    save_document,
     set_abstract_font,
-    set_all_secs_other,
-    set_headers_other,
     update_reference_doc,
     title
 )
@@ -26,9 +26,7 @@ def process_document(doc):
 
     insert_section_breaks(doc, 1)
 
-    set_all_secs_other(doc)
-
-    set_headers_other(doc)
+    apply_layout(doc, "open")
 
     process_math_equations(doc)
 
@@ -52,9 +50,11 @@ if __name__ == "__main__":
     output = f"{title}-开题报告-generated.docx"
 
     update_reference_doc()
+    # One equation cache per input, so thesis and opening report do not prune each other
+    os.environ["MATH_CACHE"] = f".math-cache-{os.path.splitext(INPUT)[0]}.json"
     assert (
         os.system(
-            f"pandoc {INPUT} -o {output} --filter pandoc-crossref --reference-doc reference.docx --citeproc --csl GB-T-7714—2015（顺序编码，双语，姓名不大写，无URL、DOI，引注有页码）.csl --bibliography {REF_FILE}"
+            f"pandoc {INPUT} -o {output} --filter pandoc-crossref --filter math_cache.py --reference-doc reference.docx --citeproc --csl GB-T-7714—2015（顺序编码，双语，姓名不大写，无URL、DOI，引注有页码）.csl --bibliography {REF_FILE}"
         )
         == 0
     ), "pandoc execution failed"
@@ -62,5 +62,5 @@ if __name__ == "__main__":
     doc = Document(output)
     assert doc is not None, "Failed to load the document"
     process_document(doc)
-    doc.save(output)
+    save_document(doc, output)
     print("Output file saved as:", output)
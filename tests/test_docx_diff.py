@@ -0,0 +1,101 @@
+import zipfile
+from collections import deque
+from pathlib import Path
+
+import pytest
+from docx import Document
+
+import docx_diff
+from docx_diff import assert_docx_equivalent, compare_docx, short_name
+from header import process_table, replace_ref_format_in_doc
+
+ROOT = Path(__file__).resolve().parent.parent
+GENERATED = ROOT / "面向优秀论文标准的研究-generated.docx"
+
+
+def rewrite(source, target, edit=lambda name, data: data, reverse=False):
+    with zipfile.ZipFile(source) as zf:
+        members = {name: zf.read(name) for name in zf.namelist()}
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in sorted(members, reverse=reverse):
+            zf.writestr(name, edit(name, members[name]))
+
+
+def swap_ids(name, data):
+    if name not in ("word/document.xml", "word/_rels/document.xml.rels"):
+        return data
+    return (
+        data.replace(b'"rId8"', b'"TMP"').replace(b'"rId7"', b'"rId8"').replace(b'"TMP"', b'"rId7"')
+    )
+
+
+def test_member_order_and_relationship_ids_are_ignored(tmp_path):
+    target = tmp_path / "copy.docx"
+    rewrite(GENERATED, target, swap_ids, reverse=True)
+    assert_docx_equivalent(GENERATED, target)
+
+
+def test_text_change_is_reported_at_run_level(tmp_path):
+    target = tmp_path / "edited.docx"
+
+    def edit(name, data):
+        if name == "word/document.xml":
+            return data.replace("模板元编程".encode(), "模版元编程".encode(), 1)
+        return data
+
+    rewrite(GENERATED, target, edit)
+    diffs = compare_docx(GENERATED, target)
+    assert len(diffs) == 1
+    assert diffs[0].startswith("word/document.xml:/w:document/w:body[1]/w:p[2]/w:r[1]/w:t[1]: text")
+    with pytest.raises(AssertionError, match="differ"):
+        assert_docx_equivalent(GENERATED, target)
+
+
+def test_short_name_knows_xml_namespace():
+    assert short_name("{http://www.w3.org/XML/1998/namespace}space") == "xml:space"
+
+
+def test_duplicate_relationship_is_reported(tmp_path):
+    target = tmp_path / "duplicate.docx"
+
+    def edit(name, data):
+        if name == "word/_rels/document.xml.rels":
+            # Same Type and Target as rId7, only the (ignored) Id differs
+            start = data.index(b'<Relationship Id="rId7"')
+            end = data.index(b"/>", start) + 2
+            duplicate = data[start:end].replace(b'"rId7"', b'"rId99"')
+            return data[:end] + duplicate + data[end:]
+        return data
+
+    rewrite(GENERATED, target, edit)
+    diffs = compare_docx(GENERATED, target)
+    assert len(diffs) == 1
+    assert diffs[0].startswith("word/_rels/document.xml.rels:/rel:Relationships: only in second:")
+
+
+def test_unexplained_mismatch_is_still_reported(tmp_path, monkeypatch):
+    target = tmp_path / "edited.docx"
+    rewrite(GENERATED, target, lambda name, data: data.replace("模板元编程".encode(), "模版元编程".encode(), 1))
+    monkeypatch.setattr(docx_diff, "diff_elements", lambda *args: None)
+    assert compare_docx(GENERATED, target) == ["word/document.xml: differs"]
+
+
+def test_fixture_accepts_reordered_independent_passes(assert_equivalent_build):
+    def reference(doc):
+        deque(map(process_table, doc.tables))
+        replace_ref_format_in_doc(doc)
+
+    def candidate(doc):
+        replace_ref_format_in_doc(doc)
+        deque(map(process_table, doc.tables))
+
+    assert_equivalent_build(lambda: Document(GENERATED), reference, candidate)
+
+
+def test_fixture_rejects_changed_output(assert_equivalent_build):
+    with pytest.raises(AssertionError, match="differ"):
+        assert_equivalent_build(
+            lambda: Document(GENERATED),
+            replace_ref_format_in_doc,
+            lambda doc: doc.add_paragraph("extra"),
+        )
@@ -0,0 +1,93 @@
+import json
+import re
+
+import pytest
+from docx.shared import Pt
+
+from header import (
+    add_page_number_to_footer,
+    apply_layout,
+    compile_layout,
+    run_append_page_number,
+    set_page_number_style,
+    title,
+)
+
+# --- Hard-coded layouts as they were before layouts/*.json ---
+def set_headers(sections, with_page_number):
+    for i, section in enumerate(sections):
+        section.header.is_linked_to_previous = False
+        paragraph = section.header.paragraphs[0]
+        for run in paragraph.runs:
+            run.clear()
+        run = paragraph.add_run(title + " ")
+        if with_page_number(i):
+            run_append_page_number(run)
+        paragraph.style = "header"
+        section.header_distance = Pt(56.7)
+
+
+def baseline_thesis_layout(doc):
+    sections = doc.sections
+    sections[0].footer_distance = Pt(56.7)
+    set_page_number_style(sections[0], fmt="upperRoman", start=1)
+    add_page_number_to_footer(sections[0])
+
+    sections[1].footer_distance = Pt(56.7)
+    set_page_number_style(sections[1], fmt="upperRoman")
+
+    sections[2].footer_distance = Pt(56.7)
+    sections[2].footer.is_linked_to_previous = False
+    set_page_number_style(sections[2], fmt="upperRoman", start=1)
+    add_page_number_to_footer(sections[2])
+
+    sections[3].footer.is_linked_to_previous = False
+    set_page_number_style(sections[3], fmt="decimal", start=1)
+    for section in sections[3:6]:
+        section.footer_distance = Pt(56.7)
+
+    set_headers(sections, lambda i: i >= 3)
+
+
+def baseline_open_layout(doc):
+    set_page_number_style(doc.sections[0], fmt="decimal", start=1)
+    set_headers(doc.sections[:1], lambda i: True)
+
+
+def test_thesis_layout_matches_baseline(assert_equivalent_build, reference_document):
+    assert_equivalent_build(
+        lambda: reference_document(6),
+        baseline_thesis_layout,
+        lambda doc: apply_layout(doc, "thesis"),
+    )
+
+
+def test_open_layout_matches_baseline(assert_equivalent_build, reference_document):
+    assert_equivalent_build(
+        lambda: reference_document(2),
+        baseline_open_layout,
+        lambda doc: apply_layout(doc, "open"),
+    )
+
+
+def test_layout_rejects_wrong_section_count(reference_document):
+    with pytest.raises(AssertionError, match="must have 6 sections"):
+        apply_layout(reference_document(2), "thesis")
+
+
+def test_compiled_layout_is_cached():
+    assert compile_layout("thesis", title) is compile_layout("thesis", title)
+
+
+@pytest.mark.parametrize("section, message", [
+    ({"colour": "red"}, r"section 1: unknown keys \['colour'\]"),
+    ({"footer": {"linkd": False}}, r"section 1 footer: unknown keys \['linkd'\]"),
+    ({"header": {"text": "x", "pagefield": True}}, r"section 1 header: unknown keys \['pagefield'\]"),
+    ({"page_numbering": {"start": 1}}, r"section 1 page_numbering: 'fmt' is required"),
+    ({"header": {"page_field": True}}, r"section 1 header: 'text' is required"),
+])
+def test_layout_rejects_bad_profiles(tmp_path, section, message):
+    profile = tmp_path / "bad.json"
+    profile.write_text(json.dumps({"sections": [{}, section]}), encoding="utf-8")
+    with pytest.raises(AssertionError, match=re.escape(f"Layout '{profile}' ") + message):
+        compile_layout(str(profile), title)
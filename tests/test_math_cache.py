@@ -0,0 +1,176 @@
+import io
+import json
+import sys
+
+import pytest
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+import math_cache
+from header import process_math_equations
+
+API_VERSION = [1, 23, 1]
+
+
+def math(math_type, latex):
+    return {"t": "Math", "c": [{"t": math_type}, latex]}
+
+
+def para(*inlines):
+    return {"t": "Para", "c": list(inlines)}
+
+
+def fragment(math_type, latex):
+    return f"<m:oMath>{math_type}:{latex}</m:oMath>"
+
+
+@pytest.fixture
+def run_filter(tmp_path, monkeypatch, capsys):
+    """Run main() on a list of blocks with pandoc stubbed out."""
+    monkeypatch.setattr(math_cache, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(math_cache, "pandoc_version", lambda: "pandoc 3.9")
+    converted = []
+
+    def convert_equations(equations, api_version):
+        converted.append(list(equations))
+        # texmath gives up on \broken, pandoc then emits plain text
+        return [
+            None if "\\broken" in latex else fragment(math_type, latex)
+            for math_type, latex in equations
+        ]
+
+    monkeypatch.setattr(math_cache, "convert_equations", convert_equations)
+
+    def run(blocks):
+        doc = {"pandoc-api-version": API_VERSION, "meta": {}, "blocks": blocks}
+        stdin = io.TextIOWrapper(io.BytesIO(json.dumps(doc).encode("utf-8")))
+        monkeypatch.setattr(sys, "stdin", stdin)
+        monkeypatch.setattr(sys, "argv", ["math_cache.py", "docx"])
+        math_cache.main()
+        return json.loads(capsys.readouterr().out)["blocks"]
+
+    run.converted = converted
+    run.cache = lambda: json.loads((tmp_path / "cache.json").read_text("utf-8"))
+    return run
+
+
+@pytest.mark.parametrize("latex", [
+    r"E = mc^2 \qquad(1.2)",
+    r"E = mc^2\qquad{(1.2)}",
+    "E =  mc^2\n\\qquad { (1.2) } ",
+])
+def test_split_equation_numbered(latex):
+    assert math_cache.split_equation("DisplayMath", latex) == (
+        "DisplayMath:E = mc^2", "E = mc^2", "1.2"
+    )
+
+
+def test_split_equation_unnumbered_and_inline():
+    assert math_cache.split_equation("DisplayMath", "a +  b") == (
+        "DisplayMath:a + b", "a + b", None
+    )
+    # Inline math is never numbered, even if it looks like it
+    assert math_cache.split_equation("InlineMath", r"x\qquad(1.1)")[2] is None
+
+
+def test_normalize_latex_keeps_comments():
+    assert math_cache.normalize_latex(" a\n  b ") == "a b"
+    assert math_cache.normalize_latex("a % note\n b") == "a % note\n b"
+
+
+def test_replace_math_splices_inlines():
+    blocks = [para({"t": "Str", "c": "x"}, {"t": "Span", "c": [["eq", [], []], [math("DisplayMath", "a")]]})]
+    result = math_cache.replace_math(blocks, lambda m: [{"t": "Space"}, {"t": "Space"}])
+    assert result[0]["c"][1]["c"][1] == [{"t": "Space"}, {"t": "Space"}]
+    assert result[0]["c"][0] == {"t": "Str", "c": "x"}
+
+
+def test_numbered_display_math(run_filter):
+    blocks = run_filter([para(math("DisplayMath", r"E = mc^2\qquad{(1.2)}"))])
+    assert blocks[0]["c"] == [
+        {"t": "RawInline", "c": ["openxml", fragment("DisplayMath", "E = mc^2")]},
+        {"t": "RawInline", "c": ["openxml", "<w:r><w:tab/><w:t>（1-2）</w:t></w:r>"]},
+    ]
+
+
+def test_unnumbered_display_and_inline_math(run_filter):
+    blocks = run_filter([
+        para(math("DisplayMath", "a + b")),
+        para({"t": "Str", "c": "see"}, math("InlineMath", "x^2")),
+    ])
+    assert blocks[0]["c"] == [
+        {"t": "RawInline", "c": ["openxml", fragment("DisplayMath", "a + b")]}
+    ]
+    assert blocks[1]["c"] == [
+        {"t": "Str", "c": "see"},
+        {"t": "RawInline", "c": ["openxml", fragment("InlineMath", "x^2")]},
+    ]
+
+
+def test_failed_conversion_keeps_math(run_filter):
+    original = math("DisplayMath", r"\broken\qquad(1.1)")
+    blocks = run_filter([para(original)])
+    assert blocks[0]["c"] == [original]
+    assert run_filter.cache()["equations"] == {}
+
+
+def test_second_run_hits_cache(run_filter):
+    blocks = [para(math("DisplayMath", r"a\qquad(1.1)")), para(math("InlineMath", "b"))]
+    first = run_filter(blocks)
+    # Renumbering must not invalidate the entry
+    renumbered = [para(math("DisplayMath", r"a\qquad{(2.1)}")), para(math("InlineMath", "b"))]
+    second = run_filter(renumbered)
+    assert len(run_filter.converted) == 1
+    assert second[0]["c"][0] == first[0]["c"][0]
+    assert second[0]["c"][1]["c"][1] == "<w:r><w:tab/><w:t>（2-1）</w:t></w:r>"
+
+
+def test_stale_entries_are_dropped(run_filter):
+    run_filter([para(math("InlineMath", "old")), para(math("InlineMath", "kept"))])
+    run_filter([para(math("InlineMath", "kept"))])
+    assert list(run_filter.cache()["equations"]) == ["InlineMath:kept"]
+    assert run_filter.cache()["pandoc"] == "pandoc 3.9"
+
+
+def test_save_cache_uses_unique_temp_file(tmp_path, monkeypatch):
+    cache_file = tmp_path / "cache.json"
+    monkeypatch.setattr(math_cache, "CACHE_FILE", str(cache_file))
+    # A fixed "<cache>.tmp" name would collide with this
+    (tmp_path / "cache.json.tmp").mkdir()
+
+    math_cache.save_cache("pandoc 3.9", {"InlineMath:x": "<m:oMath/>"})
+
+    assert json.loads(cache_file.read_text("utf-8"))["equations"] == {"InlineMath:x": "<m:oMath/>"}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cache.json", "cache.json.tmp"]
+
+
+CACHED_EQUATION = (
+    '<m:oMathPara xmlns:m="http://schemas.openxmlformats.org/officeDocument/2006/math">'
+    "<m:oMath><m:r><m:t>E</m:t></m:r></m:oMath></m:oMathPara>"
+)
+
+
+def add_cached_equation(doc):
+    """Paragraph as pandoc writes it from the filter's two RawInlines."""
+    paragraph = doc.add_paragraph()
+    paragraph._p.append(parse_xml(CACHED_EQUATION))
+    paragraph._p.append(parse_xml(
+        f'<w:r {nsdecls("w")}><w:tab/><w:t>（1-1）</w:t></w:r>'
+    ))
+    return paragraph
+
+
+def test_cached_equation_gets_layout_and_first_paragraph(reference_document):
+    doc = reference_document()
+    equation = add_cached_equation(doc)
+    following = doc.add_paragraph("text", style="Body Text")
+    heading_equation = add_cached_equation(doc)
+    heading = doc.add_paragraph("title", style="Heading 1")
+
+    process_math_equations(doc)
+
+    assert equation.style.name == "Formula Equation Numbered"
+    assert equation.text == "\t（1-1）"
+    assert following.style.name == "First Paragraph"
+    assert heading_equation.style.name == "Formula Equation Numbered"
+    assert heading.style.name == "Heading 1"
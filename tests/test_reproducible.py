@@ -0,0 +1,99 @@
+import hashlib
+import os
+import shutil
+import time
+import zipfile
+from collections import deque
+from pathlib import Path
+
+import pytest
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+from header import (
+    apply_layout,
+    force_update_fields,
+    process_math_equations,
+    process_table,
+    save_document,
+    update_reference_doc,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+GENERATED = ROOT / "面向优秀论文标准的研究-generated.docx"
+EPOCH = "1700000000"
+
+# What pandoc-crossref leaves behind: equation, em space, "(", number, ")"
+MATH_PARAGRAPH = f"""
+<w:p {nsdecls("w", "m")}>
+  <m:oMathPara><m:oMath>
+    <m:r><m:t>E=mc</m:t></m:r><m:r><m:t> </m:t></m:r>
+    <m:r><m:t>(</m:t></m:r><m:r><m:t>1.1</m:t></m:r><m:r><m:t>)</m:t></m:r>
+  </m:oMath></m:oMathPara>
+</w:p>
+"""
+
+
+def sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def build(reference_document, tmp_path, monkeypatch):
+    """Run header.py's passes on a small thesis-shaped document, saving at a given clock time."""
+    def run(name, now):
+        monkeypatch.setattr(time, "time", lambda: now)
+        doc = reference_document(6)
+        doc.add_table(rows=2, cols=3)
+        doc.element.body.insert(0, parse_xml(MATH_PARAGRAPH))
+        deque(map(process_table, doc.tables))
+        apply_layout(doc, "thesis")
+        process_math_equations(doc)
+        force_update_fields(doc)
+        output = tmp_path / f"{name}.docx"
+        save_document(doc, output)
+        return output
+
+    return run
+
+
+def test_build_twice_is_byte_stable(build, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", EPOCH)
+    assert sha256(build("first", 1800000000)) == sha256(build("second", 1900000000))
+
+
+def test_build_depends_on_clock_without_epoch(build, monkeypatch):
+    # Guards the test above: the clock really does leak into normal saves
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    assert sha256(build("first", 1800000000)) != sha256(build("second", 1900000000))
+
+
+def test_save_document_normalizes_core_properties(tmp_path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", EPOCH)
+    output = tmp_path / "out.docx"
+
+    save_document(Document(GENERATED), output)
+
+    with zipfile.ZipFile(output) as zf:
+        names = zf.namelist()
+        core = zf.read("docProps/core.xml").decode("utf-8")
+        date_times = {info.date_time for info in zf.infolist()}
+    assert names[0] == "[Content_Types].xml"
+    assert names[1:] == sorted(names[1:])
+    assert date_times == {(2023, 11, 14, 22, 13, 20)}
+    assert ">2023-11-14T22:13:20Z</dcterms:created>" in core
+    assert ">2023-11-14T22:13:20Z</dcterms:modified>" in core
+
+
+def test_update_reference_doc_is_byte_stable(tmp_path, monkeypatch):
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    shutil.copytree(ROOT / "reference", tmp_path / "reference")
+    monkeypatch.chdir(tmp_path)
+
+    update_reference_doc()
+    first = sha256("reference.docx")
+    os.utime(tmp_path / "reference" / "word" / "document.xml", (1900000000, 1900000000))
+    update_reference_doc()
+
+    assert sha256("reference.docx") == first
@@ -5,6 +5,7 @@ from docx import Document
 
 from header import (
     add_toc,
+    apply_layout,
     fix_reference_format,
     force_update_fields,
     insert_section_breaks,
@@ -13,8 +14,7 @@ from header import (
     process_math_equations,
     process_table,
     replace_ref_format_in_doc,
-    set_all_secs_thesis,
-    set_headers_thesis,
+    save_document,
     update_reference_doc, set_abstract_font,
 )
 
@@ -33,9 +33,7 @@ def process_document(doc):
 
     insert_section_breaks(doc, 5)
 
-    set_all_secs_thesis(doc)
-
-    set_headers_thesis(doc)
+    apply_layout(doc, "thesis")
 
     process_math_equations(doc)
 
@@ -57,9 +55,11 @@ if __name__ == "__main__":
     output = f"{TITLE}-generated.docx"
 
     update_reference_doc()
+    # One equation cache per input, so thesis and opening report do not prune each other
+    os.environ["MATH_CACHE"] = f".math-cache-{os.path.splitext(INPUT)[0]}.json"
     assert (
         os.system(
-            f"pandoc {INPUT} -o {output} --filter pandoc-crossref --reference-doc reference.docx --citeproc --csl GB-T-7714—2015（顺序编码，双语，姓名不大写，无URL、DOI，引注有页码）.csl --bibliography {REF_FILE}"
+            f"pandoc {INPUT} -o {output} --filter pandoc-crossref --filter math_cache.py --reference-doc reference.docx --citeproc --csl GB-T-7714—2015（顺序编码，双语，姓名不大写，无URL、DOI，引注有页码）.csl --bibliography {REF_FILE}"
         )
         == 0
     ), "pandoc execution failed"
@@ -67,5 +67,5 @@ if __name__ == "__main__":
     doc = Document(output)
     assert doc is not None, "Failed to load the document"
     process_document(doc)
-    doc.save(output)
+    save_document(doc, output)
     print("Output file saved as:", output)